@@ -1,23 +1,43 @@
 import os
+import hashlib
+import io
 from pathlib import Path
 import streamlit as st
 import ee
 import json
+import orjson
+import numpy as np
+import shapely
 import geopandas as gpd
+import pyogrio
 import tempfile
+import time
 from datetime import datetime
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from dotenv import load_dotenv
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Dict, Optional, Any, List, Union, Tuple
 
 # Peta
 import folium
 from streamlit_folium import st_folium
+import streamlit.components.v1 as components
 from folium.plugins import Draw
 
+# Akselerasi opsional untuk swap koordinat
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+try:
+    import numexpr as ne
+except ImportError:
+    ne = None
+
 # =========================
 # 0) PAGE CONFIG
 # =========================
@@ -26,6 +46,7 @@ Coord = Union[float, int]
 Pair = List[Coord]
 LAT_MIN, LAT_MAX = -11.5, 6.5
 LON_MIN, LON_MAX = 94.0, 141.5
+PREVIEW_SIMPLIFY_TOLERANCE = 0.0003  # derajat (~30 m), cukup untuk tampilan peta
 st.set_page_config(page_title="GEE Land Cover & Vegetation Analysis", layout="wide", initial_sidebar_state="expanded")
 
 # Custom CSS untuk layout yang lebih baik
@@ -141,6 +162,11 @@ API_BASE_URL = os.getenv("API_BASE_URL", "https://api.sp3stab.id/api/en")
 SERVICE_ACCOUNT = os.getenv("SERVICE_ACCOUNT_EMAIL", "geomoka@endless-bounty-416008.iam.gserviceaccount.com")
 GEE_KEY_FILE = os.getenv("GEE_KEY_FILE", "./endless-bounty-416008-a6cce2f8b208.json")
 GEE_KEY_JSON = os.getenv("GEE_KEY_JSON")
+GEOMETRY_CACHE_DIR = Path(os.getenv("GEOMETRY_CACHE_DIR", ".cache"))
+GEOMETRY_CACHE_TTL = int(os.getenv("GEOMETRY_CACHE_TTL", 7 * 24 * 3600))  # detik
+# Endpoint high-volume EE untuk banyak request paralel (opsional, aktifkan dengan GEE_HIGH_VOLUME=1)
+GEE_HIGH_VOLUME = os.getenv("GEE_HIGH_VOLUME", "").lower() in ("1", "true", "yes")
+EE_API_URL = "https://earthengine-highvolume.googleapis.com" if GEE_HIGH_VOLUME else None
 
 def init_ee():
     """Initialize Google Earth Engine"""
@@ -157,7 +183,7 @@ def init_ee():
                 "https://www.googleapis.com/auth/devstorage.read_write",
             ]
             creds = service_account.Credentials.from_service_account_info(sa_info, scopes=scopes)
-            ee.Initialize(credentials=creds)
+            ee.Initialize(credentials=creds, opt_url=EE_API_URL)
             st.success("✔ Earth Engine initialized via Streamlit secrets.")
             return
 
@@ -172,14 +198,14 @@ def init_ee():
                 "https://www.googleapis.com/auth/devstorage.read_write",
             ]
             creds = service_account.Credentials.from_service_account_info(sa_info, scopes=scopes)
-            ee.Initialize(credentials=creds)
+            ee.Initialize(credentials=creds, opt_url=EE_API_URL)
             st.success("✔ Earth Engine initialized from GEE_KEY_JSON.")
             return
 
         # Prioritas 3: file key lokal (punya scope by default di helper EE)
         if GEE_KEY_FILE and Path(GEE_KEY_FILE).exists():
             credentials = ee.ServiceAccountCredentials(SERVICE_ACCOUNT, GEE_KEY_FILE)
-            ee.Initialize(credentials)
+            ee.Initialize(credentials, opt_url=EE_API_URL)
             st.success("✔ Earth Engine initialized with local Service Account file.")
             return
 
@@ -193,26 +219,58 @@ def init_ee():
 # =========================
 # 1B) INDONESIA ADMIN API
 # =========================
-@st.cache_data(ttl=3600)
+@st.cache_resource
+def _http_session() -> requests.Session:
+    """Session HTTP bersama (connection pooling) yang bertahan lintas rerun."""
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=8))
+    return session
+
+@st.cache_resource
+def _prefetch_pool() -> ThreadPoolExecutor:
+    """Thread pool bersama untuk prefetch request API di background."""
+    return ThreadPoolExecutor(max_workers=8)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _fetch_region_dropdown(endpoint: str, parent_code: Optional[str] = None) -> Dict:
+    params = {"is_for_dropdown": 1}
+    if parent_code:
+        params["parent_code"] = parent_code
+    
+    response = _http_session().get(f"{API_BASE_URL}/{endpoint}", params=params, timeout=10)
+    response.raise_for_status()
+    
+    data = response.json()
+    
+    if isinstance(data, dict):
+        return data
+    
+    return {}
+
+def prefetch_region_dropdown(endpoint: str, parent_code: Optional[str] = None) -> Future:
+    """Jadwalkan fetch dropdown di background; future disimpan di session_state dan dipakai ulang."""
+    futures = st.session_state.setdefault("region_futures", {})
+    key = (endpoint, parent_code)
+    if key not in futures:
+        futures[key] = _prefetch_pool().submit(_fetch_region_dropdown, endpoint, parent_code)
+    return futures[key]
+
+def prune_region_futures(keep) -> None:
+    """Buang future dropdown yang parent-nya tidak lagi sesuai pilihan saat ini (tidak akan pernah dibaca)."""
+    futures = st.session_state.setdefault("region_futures", {})
+    for key in [k for k in futures if k not in keep]:
+        futures.pop(key).cancel()
+
 def fetch_region_dropdown(endpoint: str, parent_code: Optional[str] = None) -> Dict:
     """Fetch region list from API for dropdown"""
     try:
-        params = {"is_for_dropdown": 1}
-        if parent_code:
-            params["parent_code"] = parent_code
-        
-        response = requests.get(f"{API_BASE_URL}/{endpoint}", params=params, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        if isinstance(data, dict):
-            return data
-        
-        return {}
+        return prefetch_region_dropdown(endpoint, parent_code).result()
     except Exception as e:
         st.error(f"Error fetching {endpoint}: {e}")
         return {}
+    finally:
+        # Future yang sudah dibaca (sukses/gagal) dibuang: rerun berikutnya lewat cache_data (ttl) lagi
+        st.session_state.region_futures.pop((endpoint, parent_code), None)
 
 def looks_like_latlon(pair: Pair) -> bool:
     """Kembalikan True jika pasangan tampak [lat, lon] (kebalik) untuk Indonesia."""
@@ -225,22 +283,45 @@ def looks_like_latlon(pair: Pair) -> bool:
         return False
     return (LAT_MIN <= a <= LAT_MAX) and (LON_MIN <= b <= LON_MAX)
 
-def swap_xy_in_coords(obj: Any) -> Any:
-    """Rekursif menukar [lat, lon] -> [lon, lat] pada struktur koordinat GeoJSON."""
-    if isinstance(obj, (list, tuple)):
-        if len(obj) >= 2 and all(isinstance(x, (int, float, str)) for x in obj[:2]):
-            if looks_like_latlon(obj):
-                a, b = float(obj[0]), float(obj[1])
-                rest = [float(x) for x in obj[2:]] if len(obj) > 2 else []
-                return [b, a, *rest]
-            else:
-                return [float(x) if isinstance(x, str) else x for x in obj]
-        else:
-            return [swap_xy_in_coords(x) for x in obj]
-    elif isinstance(obj, dict):
-        return {k: swap_xy_in_coords(v) if k != "type" else v for k, v in obj.items()}
-    else:
+def swap_xy_in_coords(obj: Any, needs_swap: bool = True) -> Any:
+    """Tukar [lat, lon] -> [lon, lat] pada struktur koordinat GeoJSON (iteratif, tanpa rekursi)."""
+    if not needs_swap:
         return obj
+    number = (int, float)
+    root = [obj]
+    stack = [(obj, root, 0)]
+    while stack:
+        node, parent, key = stack.pop()
+        t = type(node)
+        if t is list or t is tuple:
+            if len(node) >= 2 and type(node[0]) in number and type(node[1]) in number:
+                parent[key] = [node[1], node[0], *node[2:]]
+            else:
+                if t is tuple:
+                    node = list(node)
+                    parent[key] = node
+                for i, child in enumerate(node):
+                    stack.append((child, node, i))
+        elif t is dict:
+            for k, v in node.items():
+                if k != "type":
+                    stack.append((v, node, k))
+    return root[0]
+
+def first_coordinate(coords: Any) -> Any:
+    """Turun ke pasangan koordinat pertama pada struktur bersarang."""
+    c = coords
+    while isinstance(c, list) and c and isinstance(c[0], list):
+        c = c[0]
+    return c
+
+def coerce_numeric_coords(coords: Any) -> Any:
+    """String angka -> float pada struktur koordinat bersarang (jalur fallback saja)."""
+    if isinstance(coords, (list, tuple)):
+        return [coerce_numeric_coords(c) for c in coords]
+    if isinstance(coords, str):
+        return float(coords)
+    return coords
 
 def swap_geometry(feature: Dict) -> Dict:
     geom = feature.get("geometry")
@@ -248,71 +329,210 @@ def swap_geometry(feature: Dict) -> Dict:
         return feature
 
     gtype = geom["type"]
-    coords = geom["coordinates"]
+    try:
+        coords = coerce_numeric_coords(geom["coordinates"])
+    except ValueError:
+        return feature
 
-    new_coords = swap_xy_in_coords(coords)
+    # API konsisten per fitur: cukup uji satu titik, lalu tukar (atau tidak) seluruhnya
+    needs_swap = looks_like_latlon(first_coordinate(coords))
+    new_coords = swap_xy_in_coords(coords, needs_swap)
     feature["geometry"] = {"type": gtype, "coordinates": new_coords}
     return feature
 
-def swap_featurecollection(fc: Dict) -> Dict:
-    if not isinstance(fc, dict) or fc.get("type") != "FeatureCollection":
-        return fc
-    feats = fc.get("features", [])
-    fc["features"] = [swap_geometry(f) for f in feats]
-    return fc
-
-@st.cache_data(ttl=3600)
-def fetch_region_geometry(endpoint: str, code: str) -> Optional[Dict]:
-    """Fetch region geometry from API, lalu betulkan urutan lat-lon -> lon-lat bila perlu."""
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _swap_if_latlon(arr, lat_min, lat_max, lon_min, lon_max):
+        """Kernel Numba: tukar kolom in-place bila >90% titik tampak [lat, lon]."""
+        n = arr.shape[0]
+        cnt = 0
+        for i in prange(n):
+            a = arr[i, 0]
+            b = arr[i, 1]
+            if lat_min <= a <= lat_max and lon_min <= b <= lon_max:
+                cnt += 1
+        if cnt <= 0.9 * n:
+            return False
+        for i in prange(n):
+            tmp = arr[i, 0]
+            arr[i, 0] = arr[i, 1]
+            arr[i, 1] = tmp
+        return True
+else:
+    _swap_if_latlon = None
+
+def swap_latlon_inplace(coords: np.ndarray) -> bool:
+    """Tukar kolom array (N, 2) in-place bila mayoritas titik tampak [lat, lon]. True jika ditukar."""
+    if _swap_if_latlon is not None:
+        return bool(_swap_if_latlon(coords, LAT_MIN, LAT_MAX, LON_MIN, LON_MAX))
+
+    # Satu heuristik untuk semua titik: API konsisten, jadi cukup cek mayoritas
+    x, y = coords[:, 0], coords[:, 1]
+    if ne is not None:
+        # numexpr memfusikan keempat perbandingan dalam satu pass
+        mask = ne.evaluate(
+            "(a >= lat_min) & (a <= lat_max) & (b >= lon_min) & (b <= lon_max)",
+            local_dict={"a": x, "b": y, "lat_min": LAT_MIN, "lat_max": LAT_MAX,
+                        "lon_min": LON_MIN, "lon_max": LON_MAX},
+        )
+    else:
+        mask = (x >= LAT_MIN) & (x <= LAT_MAX) & (y >= LON_MIN) & (y <= LON_MAX)
+    if mask.mean() <= 0.9:
+        return False
+    coords[:] = coords[:, ::-1].copy()
+    return True
+
+def swap_gdf_latlon(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """Tukar [lat, lon] -> [lon, lat] langsung pada buffer koordinat GeoDataFrame (vektor)."""
+    coords = shapely.get_coordinates(gdf.geometry.to_numpy(), include_z=False)
+    if len(coords) == 0 or not swap_latlon_inplace(coords):
+        return gdf
+    geoms = shapely.set_coordinates(gdf.geometry.to_numpy(), coords)
+    return gdf.set_geometry(gpd.GeoSeries(geoms, index=gdf.index, crs=gdf.crs))
+
+def region_to_gdf(region_data: Dict) -> gpd.GeoDataFrame:
+    """FeatureCollection wilayah -> GeoDataFrame EPSG:4326 dengan urutan lon-lat."""
     try:
-        response = requests.get(f"{API_BASE_URL}/{endpoint}", params={"code": code}, timeout=15)
-        response.raise_for_status()
-        result = response.json()
-
-        if result.get("meta", {}).get("code") == 200:
-            region_data = result.get("data", {}).get("region")
-            if region_data and "features" in region_data:
-                region_data = swap_featurecollection(region_data)
-                return region_data
+        # Dict hasil orjson langsung ke shapely, lalu tukar koordinat secara vektor (tanpa serialisasi ulang)
+        gdf = gpd.GeoDataFrame.from_features(region_data["features"], crs="EPSG:4326")
+    except Exception:
+        # Fallback: struktur tidak bisa diparse shapely (mis. koordinat berupa string) -> dikonversi & ditukar per fitur
+        features = [swap_geometry(f) for f in region_data["features"]]
+        return gpd.GeoDataFrame.from_features(features, crs="EPSG:4326")
+    return swap_gdf_latlon(gdf)
 
+def _read_geometry_cache(cache_path: Path) -> Optional[gpd.GeoDataFrame]:
+    """Baca cache parquet bila ada & belum kedaluwarsa; file rusak/kedaluwarsa dihapus."""
+    try:
+        if time.time() - cache_path.stat().st_mtime > GEOMETRY_CACHE_TTL:
+            cache_path.unlink(missing_ok=True)
+            return None
+        return gpd.read_parquet(cache_path)
+    except FileNotFoundError:
         return None
-    except Exception as e:
-        st.error(f"Error fetching geometry for {code}: {e}")
+    except Exception:
+        # Mis. file terpotong: buang agar di-fetch ulang
+        cache_path.unlink(missing_ok=True)
         return None
 
-def geojson_to_ee_geometry(geojson_data: Dict) -> Tuple[Optional[ee.Geometry], Optional[gpd.GeoDataFrame]]:
-    """Convert GeoJSON from API to EE Geometry and GeoDataFrame"""
+def _write_geometry_cache(gdf: gpd.GeoDataFrame, cache_path: Path) -> None:
+    """Tulis cache parquet secara atomik (file sementara + os.replace)."""
+    tmp_path = None
     try:
-        if not geojson_data or "features" not in geojson_data:
-            return None, None
-        
-        gdf = gpd.GeoDataFrame.from_features(geojson_data["features"])
-        
-        if gdf.empty:
-            return None, None
-        
-        if gdf.crs is None:
-            gdf.set_crs("EPSG:4326", inplace=True)
-        elif gdf.crs != "EPSG:4326":
-            gdf = gdf.to_crs("EPSG:4326")
-        
-        feature = geojson_data["features"][0]
-        ee_geom = ee.Geometry(feature["geometry"])
-        
-        return ee_geom, gdf
-        
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=cache_path.parent, suffix=".parquet.tmp", delete=False) as tmp_file:
+            tmp_path = tmp_file.name
+        gdf.to_parquet(tmp_path)
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        # Cache disk opsional (mis. filesystem read-only)
+        if tmp_path:
+            Path(tmp_path).unlink(missing_ok=True)
+
+@st.cache_resource(ttl=3600, max_entries=128, show_spinner=False)
+def fetch_region_geometry(endpoint: str, code: str) -> gpd.GeoDataFrame:
+    """Fetch region geometry (cache disk parquet), lalu betulkan urutan lat-lon -> lon-lat bila perlu.
+
+    Error di-raise (tidak di-cache); pemanggil yang menampilkan pesan.
+    """
+    cache_path = GEOMETRY_CACHE_DIR / f"{endpoint}_{code}.parquet"
+    cached = _read_geometry_cache(cache_path)
+    if cached is not None:
+        return cached
+
+    response = _http_session().get(f"{API_BASE_URL}/{endpoint}", params={"code": code}, timeout=15)
+    response.raise_for_status()
+    result = orjson.loads(response.content)
+
+    if result.get("meta", {}).get("code") != 200:
+        raise ValueError(f"API mengembalikan status {result.get('meta', {}).get('code')}")
+
+    region_data = result.get("data", {}).get("region")
+    if not region_data or "features" not in region_data:
+        raise ValueError("Respons API tidak berisi geometri wilayah")
+
+    gdf = region_to_gdf(region_data)
+    if gdf.empty:
+        raise ValueError("Geometri wilayah kosong")
+
+    _write_geometry_cache(gdf, cache_path)
+
+    return gdf
+
+def gdf_to_ee_geometry(gdf: gpd.GeoDataFrame, tolerance: float = 0.0005) -> Tuple[ee.Geometry, gpd.GeoDataFrame]:
+    """Convert region GeoDataFrame from API to EE Geometry (GDF disederhanakan dikembalikan untuk preview)"""
+    # Kontrak API: geometri sudah EPSG:4326, tidak perlu reproject
+    if gdf.crs is not None and gdf.crs != "EPSG:4326":
+        raise ValueError(f"CRS geometri wilayah harus EPSG:4326, bukan {gdf.crs}")
+    
+    # EE hanya butuh fitur pertama: olah geometri itu saja, GDF tidak disalin
+    geom = gdf.geometry.iloc[0]
+    # Kurangi jumlah vertex & digit desimal sebelum dikirim ke EE (tolerance 0 = presisi penuh)
+    if tolerance > 0:
+        geom = geom.simplify(tolerance, preserve_topology=True)
+        geom = shapely.set_precision(geom, 1e-5)
+    
+    ee_geom = ee.Geometry(geom.__geo_interface__)
+    
+    return ee_geom, simplify_for_preview(gdf)
+
+def simplify_for_preview(gdf: gpd.GeoDataFrame, tolerance: float = PREVIEW_SIMPLIFY_TOLERANCE) -> gpd.GeoDataFrame:
+    """Salinan GDF dengan geometri disederhanakan khusus untuk peta folium (bukan untuk EE)."""
+    preview = gdf.copy()
+    preview["geometry"] = preview.geometry.simplify(tolerance, preserve_topology=True)
+    return preview
+
+@st.cache_resource(ttl=3600, max_entries=64, show_spinner=False)
+def get_region_ee(endpoint: str, code: str, tolerance: float) -> Tuple[ee.Geometry, gpd.GeoDataFrame]:
+    """Region EE Geometry + GeoDataFrame, di-cache sebagai resource (tanpa hashing/copy per rerun)."""
+    return gdf_to_ee_geometry(fetch_region_geometry(endpoint, code), tolerance)
+
+def load_region_ee(endpoint: str, code: str, tolerance: float) -> Tuple[Optional[ee.Geometry], Optional[gpd.GeoDataFrame]]:
+    """Ambil region AOI; error ditampilkan di sini agar kegagalan sementara tidak tersimpan di cache"""
+    try:
+        return get_region_ee(endpoint, code, tolerance)
     except Exception as e:
-        st.error(f"Error converting geometry: {e}")
+        st.error(f"Error fetching geometry for {code}: {e}")
         return None, None
 
 # =========================
 # 2) HELPER: add ee layer
 # =========================
+def ee_cache_key(ee_object) -> str:
+    """Kunci cache stabil untuk objek EE dari graf terserialisasi (lokal, tanpa RPC)."""
+    return hashlib.sha1(ee_object.serialize().encode("utf-8")).hexdigest()
+
+@st.cache_resource(ttl=3600, max_entries=256, show_spinner=False)
+def _get_tile_url(graph_key: str, vis_key: str, _ee_object, _vis_params) -> str:
+    """Tile URL EE per (graf, vis_params); getMapId hanya dipanggil saat cache miss."""
+    return _ee_object.getMapId(_vis_params)["tile_fetcher"].url_format
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _get_info_cached(cache_key: str, _ee_object) -> Any:
+    return _ee_object.getInfo()
+
+def get_info_cached(ee_object) -> Any:
+    """getInfo() yang di-cache per graf EE, sehingga rerun tanpa perubahan tidak memicu RPC."""
+    return _get_info_cached(ee_cache_key(ee_object), ee_object)
+
+def describe_aoi(aoi) -> Dict:
+    """Centroid [lon, lat] & luas (m²) AOI dalam satu round trip EE."""
+    geom = ee.Geometry(aoi)
+    return get_info_cached(ee.Dictionary({
+        "center": geom.centroid(maxError=10).coordinates(),
+        "area_m2": geom.area(maxError=10),
+    }))
+
 def add_ee_layer(f_map, ee_object, vis_params, name):
     try:
-        map_id = ee_object.getMapId(vis_params)
+        tile_url = _get_tile_url(
+            ee_cache_key(ee_object),
+            json.dumps(vis_params, sort_keys=True),
+            ee_object,
+            vis_params,
+        )
         folium.raster_layers.TileLayer(
-            tiles=map_id["tile_fetcher"].url_format,
+            tiles=tile_url,
             attr='Map © Google Earth Engine',
             name=name,
             overlay=True,
@@ -329,31 +549,37 @@ folium.Map.add_ee_layer = add_ee_layer
 def file_to_ee_geometry(uploaded_file):
     """Convert uploaded GeoJSON/Shapefile to Earth Engine geometry"""
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=uploaded_file.name) as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            tmp_path = tmp_file.name
-        
         if uploaded_file.name.endswith('.geojson') or uploaded_file.name.endswith('.json'):
-            gdf = gpd.read_file(tmp_path)
-        elif uploaded_file.name.endswith('.zip'):
-            gdf = gpd.read_file(f"zip://{tmp_path}")
+            # GeoJSON bisa langsung diparse dari memori, tanpa file sementara
+            gdf = pyogrio.read_dataframe(io.BytesIO(uploaded_file.getvalue()), use_arrow=True)
         else:
-            gdf = gpd.read_file(tmp_path)
+            # Shapefile/zip butuh path nyata di disk
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                tmp_path = os.path.join(tmp_dir, os.path.basename(uploaded_file.name))
+                with open(tmp_path, "wb") as tmp_file:
+                    tmp_file.write(uploaded_file.getvalue())
+                
+                if uploaded_file.name.endswith('.zip'):
+                    gdf = pyogrio.read_dataframe(f"/vsizip/{tmp_path}", use_arrow=True)
+                else:
+                    gdf = pyogrio.read_dataframe(tmp_path, use_arrow=True)
         
         if gdf.crs and gdf.crs != 'EPSG:4326':
             gdf = gdf.to_crs('EPSG:4326')
         
-        union_geom = gdf.geometry.unary_union
-        geojson = json.loads(gpd.GeoSeries([union_geom]).to_json())
-        ee_geom = ee.Geometry(geojson['features'][0]['geometry'])
+        # Coverage union O(n) untuk poligon bersisian (batas admin); fallback ke union biasa
+        try:
+            union_geom = gdf.geometry.union_all(method="coverage")
+            if union_geom.is_empty or not union_geom.is_valid:
+                raise ValueError("input bukan coverage yang valid")
+        except Exception:
+            union_geom = gdf.geometry.union_all()
+        ee_geom = ee.Geometry(shapely.geometry.mapping(union_geom))
         
-        os.unlink(tmp_path)
-        return ee_geom, gdf
+        return ee_geom, simplify_for_preview(gdf)
         
     except Exception as e:
         st.error(f"Error processing file: {e}")
-        if 'tmp_path' in locals():
-            os.unlink(tmp_path)
         return None, None
 
 # =========================
@@ -426,38 +652,50 @@ VEGETATION_INDICES = {
     }
 }
 
+def _calc_evi(image):
+    nir = image.select('B8')
+    red = image.select('B4')
+    blue = image.select('B2')
+    evi = nir.subtract(red).multiply(2.5).divide(
+        nir.add(red.multiply(6)).subtract(blue.multiply(7.5)).add(1)
+    )
+    return evi.rename("EVI")
+
+def _calc_savi(image):
+    nir = image.select('B8')
+    red = image.select('B4')
+    savi = nir.subtract(red).divide(nir.add(red).add(0.5)).multiply(1.5)
+    return savi.rename("SAVI")
+
+def _calc_bsi(image):
+    blue = image.select('B2')
+    red = image.select('B4')
+    nir = image.select('B8')
+    swir = image.select('B11')
+    bsi = swir.add(red).subtract(nir).subtract(blue).divide(
+        swir.add(red).add(nir).add(blue)
+    )
+    return bsi.rename("BSI")
+
+def _normalized_difference(index_name):
+    bands = VEGETATION_INDICES[index_name]["bands"]
+    return lambda image: image.normalizedDifference(bands).rename(index_name)
+
+# Tabel fungsi indeks dibangun sekali saat import
+_INDEX_FUNCS = {
+    "EVI": _calc_evi,
+    "SAVI": _calc_savi,
+    "BSI": _calc_bsi,
+    **{name: _normalized_difference(name) for name in ("NDVI", "NDWI", "MNDWI", "NDBI", "NDMI")}
+}
+
 def calculate_index(image, index_name):
     """Calculate vegetation index"""
-    index_info = VEGETATION_INDICES[index_name]
-    
-    if index_name == "EVI":
-        nir = image.select('B8')
-        red = image.select('B4')
-        blue = image.select('B2')
-        evi = nir.subtract(red).multiply(2.5).divide(
-            nir.add(red.multiply(6)).subtract(blue.multiply(7.5)).add(1)
-        )
-        return evi.rename(index_name)
-    
-    elif index_name == "SAVI":
-        nir = image.select('B8')
-        red = image.select('B4')
-        savi = nir.subtract(red).divide(nir.add(red).add(0.5)).multiply(1.5)
-        return savi.rename(index_name)
-    
-    elif index_name == "BSI":
-        blue = image.select('B2')
-        red = image.select('B4')
-        nir = image.select('B8')
-        swir = image.select('B11')
-        bsi = swir.add(red).subtract(nir).subtract(blue).divide(
-            swir.add(red).add(nir).add(blue)
-        )
-        return bsi.rename(index_name)
-    
-    else:
-        bands = index_info["bands"]
-        return image.normalizedDifference(bands).rename(index_name)
+    return _INDEX_FUNCS[index_name](image)
+
+def calculate_indices(image, index_names):
+    """Calculate several indices as one multi-band image (one band per index)"""
+    return ee.Image.cat([_INDEX_FUNCS[name](image) for name in index_names])
 
 # =========================
 # 5) LAND COVER LEGENDS
@@ -501,19 +739,16 @@ LAND_COVER_LEGENDS = {
     }
 }
 
-def add_legend_to_map(f_map, legend_dict, title):
-    """Add legend to folium map with black text"""
-    legend_html = f'''
-    <div style="position: fixed; 
-                bottom: 50px; right: 50px; width: 220px; height: auto; 
-                background-color: white; z-index: 1000; 
-                border: 2px solid grey; border-radius: 5px;
-                font-size: 14px; box-shadow: 2px 2px 5px rgba(0,0,0,0.3);">
-        <p style="margin: 10px; font-weight: bold; color: black;">{title}</p>
-    '''
-    
-    for key, value in legend_dict.items():
-        legend_html += f'''
+LEGEND_TITLES = {
+    "ESA_WorldCover": "ESA WorldCover",
+    "ESRI_LandCover": "ESRI Land Cover",
+    "Dynamic_World": "Dynamic World"
+}
+
+def build_legend_html(legend_dict, title):
+    """Build legend HTML (black text) for a land cover legend"""
+    items = [
+        f'''
         <p style="margin: 5px 10px; color: black;">
             <span style="background-color: {value['color']}; 
                         width: 20px; height: 12px; 
@@ -523,40 +758,65 @@ def add_legend_to_map(f_map, legend_dict, title):
             {value['label']}
         </p>
         '''
-    
-    legend_html += '</div>'
-    f_map.get_root().html.add_child(folium.Element(legend_html))
+        for value in legend_dict.values()
+    ]
+    return "".join([
+        f'''
+    <div style="position: fixed; 
+                bottom: 50px; right: 50px; width: 220px; height: auto; 
+                background-color: white; z-index: 1000; 
+                border: 2px solid grey; border-radius: 5px;
+                font-size: 14px; box-shadow: 2px 2px 5px rgba(0,0,0,0.3);">
+        <p style="margin: 10px; font-weight: bold; color: black;">{title}</p>
+    ''',
+        *items,
+        '</div>'
+    ])
+
+# HTML legenda dibangun sekali saat import, bukan setiap render peta
+_LEGEND_HTML = {
+    name: build_legend_html(legend, LEGEND_TITLES[name])
+    for name, legend in LAND_COVER_LEGENDS.items()
+}
+
+def add_legend_to_map(f_map, legend_name):
+    """Add precomputed legend to folium map"""
+    f_map.get_root().html.add_child(folium.Element(_LEGEND_HTML[legend_name]))
 
 # =========================
 # 6) DYNAMIC WORLD FUNCTIONS
 # =========================
-def create_dynamic_world_composite(aoi, start_date, end_date, mode='mode'):
+DW_PROB_BANDS = [
+    'water', 'trees', 'grass', 'flooded_vegetation',
+    'crops', 'shrub_and_scrub', 'built', 'bare', 'snow_and_ice'
+]
+
+@st.cache_resource(ttl=3600, max_entries=32, show_spinner=False)
+def _dw_collection(aoi_key, start_date, end_date, _aoi, parallel_scale=1):
+    """Filtered Dynamic World collection + reduced images, cached per AOI/date (EE handles, not data)"""
+    dw = ee.ImageCollection('GOOGLE/DYNAMICWORLD/V1').filterDate(start_date, end_date).filterBounds(_aoi)
+    classification = dw.select('label').reduce(ee.Reducer.mode(), parallel_scale)
+    prob_bands = dw.select(DW_PROB_BANDS).mean()
+    return classification, prob_bands
+
+def create_dynamic_world_composite(aoi, start_date, end_date, mode='mode', parallel_scale=1):
     """Create Dynamic World composite"""
-    dw = ee.ImageCollection('GOOGLE/DYNAMICWORLD/V1').filterDate(start_date, end_date).filterBounds(aoi)
+    classification, prob_bands = _dw_collection(ee_cache_key(aoi), start_date, end_date, aoi, parallel_scale)
     
     if mode == 'mode':
-        classification = dw.select('label')
-        return classification.reduce(ee.Reducer.mode()).clip(aoi)
+        return classification.clip(aoi)
     elif mode == 'probability':
-        return dw.select(['water', 'trees', 'grass', 'flooded_vegetation', 
-                         'crops', 'shrub_and_scrub', 'built', 'bare', 'snow_and_ice']).mean().clip(aoi)
+        return prob_bands.clip(aoi)
     else:
-        return create_hillshade_rgb(dw, aoi)
+        return create_hillshade_rgb(classification, prob_bands, aoi)
 
-def create_hillshade_rgb(dw_col, aoi):
+def create_hillshade_rgb(classification, prob_bands, aoi):
     """Create hillshade RGB visualization for Dynamic World"""
     VIS_PALETTE = [
         '419bdf', '397d49', '88b053', '7a87c6', 
         'e49635', 'dfc35a', 'c4281b', 'a59b8f', 'b39fe1'
     ]
     
-    classification = dw_col.select('label').mode()
-    
-    prob_bands = dw_col.select([
-        'water', 'trees', 'grass', 'flooded_vegetation', 
-        'crops', 'shrub_and_scrub', 'built', 'bare', 'snow_and_ice'
-    ]).mean()
-    
     max_prob = prob_bands.reduce(ee.Reducer.max())
     hillshade = ee.Terrain.hillshade(max_prob.multiply(100)).divide(255)
     rgbImage = classification.visualize(min=0, max=8, palette=VIS_PALETTE)
@@ -567,15 +827,73 @@ def create_hillshade_rgb(dw_col, aoi):
 # MASKING FUNCTIONS FOR DIFFERENT DATASETS
 # =========================
 def mask_s2_clouds(img, dataset_config):
-    """Mask clouds for Sentinel-2 imagery"""
+    """Mask clouds for Sentinel-2 imagery (nilai DN; skala reflektansi di reduce_s2_composite)"""
     if dataset_config.get("has_qa"):
         qa = img.select("QA60")
-        cloud = qa.bitwiseAnd(1 << 10).neq(0)
-        cirrus = qa.bitwiseAnd(1 << 11).neq(0)
-        mask = cloud.Or(cirrus).Not()
-        return img.updateMask(mask).divide(10000)
+        # Bit 10 (opaque cloud) & bit 11 (cirrus) dicek dalam satu ekspresi
+        mask = qa.bitwiseAnd((1 << 10) | (1 << 11)).eq(0)
+        return img.updateMask(mask)
     else:
-        return img.divide(10000)
+        return img
+
+def _add_scl_quality(img):
+    """Band 'q' = 1 untuk piksel vegetasi/tanah/air (SCL 4, 5, 6), 0 selainnya"""
+    return img.addBands(img.select("SCL").remap([4, 5, 6], [1, 1, 1], 0).rename("q"))
+
+_COMPOSITE_REDUCERS = {
+    "Median": lambda col: col.median(),
+    "Mean": lambda col: col.mean(),
+    "Max": lambda col: col.max(),
+    "Min": lambda col: col.min(),
+    # Tanpa reduksi per piksel: ambil piksel dari scene bersih (butuh band SCL)
+    "Quality": lambda col: col.map(_add_scl_quality).qualityMosaic("q"),
+}
+
+def reduce_s2_composite(collection, method="Median"):
+    """Composite Sentinel-2 lalu skala ke reflektansi: satu divide(10000) untuk seluruh koleksi"""
+    reducer = _COMPOSITE_REDUCERS.get(method, _COMPOSITE_REDUCERS["Median"])
+    return reducer(collection).divide(10000)
+
+def s2_required_bands(dataset_config, index_names, include_rgb=False) -> Tuple[str, ...]:
+    """Band Sentinel-2 yang benar-benar dipakai (indeks, RGB, QA60 untuk masking)"""
+    bands = set()
+    for name in index_names:
+        bands.update(VEGETATION_INDICES[name]["bands"])
+    if include_rgb:
+        bands.update(dataset_config["bands"]["RGB"])
+    if dataset_config.get("has_qa"):
+        bands.add("QA60")
+    return tuple(sorted(bands))
+
+def scl_cloud_fraction(img, aoi):
+    """Set properti 'cloud_frac': fraksi piksel awan/bayangan (SCL 3, 8, 9, 10) di AOI, dihitung di 60 m"""
+    cloud = img.select("SCL").remap([3, 8, 9, 10], [1, 1, 1, 1], 0).rename("cloud")
+    frac = cloud.reduceRegion(
+        reducer=ee.Reducer.mean(),
+        geometry=aoi,
+        scale=60,
+        maxPixels=1e7,
+        bestEffort=True
+    ).get("cloud")
+    return img.set("cloud_frac", frac)
+
+@st.cache_resource(ttl=3600, max_entries=64, show_spinner=False)
+def get_s2_collection(aoi_key, dataset_name, start_date, end_date, cloud_threshold, bands, _aoi, max_cloud_fraction=None):
+    """Koleksi Sentinel-2 terfilter + cloud mask, di-cache per (AOI, dataset, tanggal, cloud, band) untuk semua analisis.
+
+    max_cloud_fraction (hanya koleksi SR yang punya band SCL): buang scene yang awannya di AOI
+    melebihi batas sebelum band spektral dibaca.
+    """
+    dataset_config = SENTINEL2_DATASETS[dataset_name]
+    s2 = (ee.ImageCollection(dataset_config["collection"])
+          .filterBounds(_aoi)
+          .filterDate(start_date, end_date)
+          .filter(ee.Filter.lte("CLOUDY_PIXEL_PERCENTAGE", cloud_threshold)))
+    if max_cloud_fraction is not None:
+        s2 = (s2.map(lambda img: scl_cloud_fraction(img, _aoi))
+                .filter(ee.Filter.lt("cloud_frac", max_cloud_fraction)))
+    return (s2.select(list(bands))
+              .map(lambda img: mask_s2_clouds(img, dataset_config)))
 
 # =========================
 # 7) UI / SIDEBAR
@@ -593,6 +911,20 @@ with st.sidebar:
     
     year = st.slider("Tahun", 2017, 2025, 2022)
     zoom0 = st.slider("Zoom awal peta", 2, 12, 10)
+    simplify_tolerance = st.number_input(
+        "Toleransi simplifikasi AOI (derajat)",
+        min_value=0.0,
+        max_value=0.01,
+        value=0.0005,
+        step=0.0001,
+        format="%.5f",
+        key="simplify_tolerance",
+        help="Simplifikasi batas wilayah sebelum dikirim ke Earth Engine (~50 m pada default); 0 = presisi penuh."
+    )
+    tile_scale = st.slider(
+        "Tile scale EE", 1, 16, 4,
+        help="Pecah reduksi Earth Engine menjadi tile lebih kecil yang diproses paralel. Naikkan jika AOI besar gagal karena batas memori."
+    )
     
     if analysis_type in ["Vegetation Indices Analysis", "Combined Analysis"]:
         st.subheader("Parameter Sentinel-2")
@@ -648,10 +980,12 @@ with st.sidebar:
                 help="mode: Most common class, hillshade: Top-1 probability with hillshade, probability: Mean probability bands"
             )
 
-# Init EE
-with st.status("🔄 Initializing Earth Engine...", expanded=False) as status:
-    init_ee()
-    status.update(label="✅ Earth Engine Ready", state="complete")
+# Init EE (sekali per sesi)
+if "ee_initialized" not in st.session_state:
+    with st.status("🔄 Initializing Earth Engine...", expanded=False) as status:
+        init_ee()
+        status.update(label="✅ Earth Engine Ready", state="complete")
+    st.session_state.ee_initialized = True
 
 # =========================
 # 8) AOI (Area of Interest) WITH INDONESIA ADMIN
@@ -678,6 +1012,7 @@ with col1:
     )
     
     aoi = None
+    aoi_outline = None  # GeoJSON lokal AOI untuk outline peta hasil (tanpa RPC)
     preview_gdf = None
     region_name = ""
     
@@ -685,6 +1020,21 @@ with col1:
     if aoi_mode == "Batas Wilayah Indonesia":
         st.info("🇮🇩 Pilih wilayah administratif Indonesia")
         
+        # Mulai paralel semua level yang kodenya sudah diketahui dari pilihan sebelumnya;
+        # tiap selectbox di bawah hanya menunggu future-nya sendiri
+        wanted = [("province", None)] + [
+            (child_endpoint, parent["code"])
+            for child_endpoint, parent in (
+                ("city", st.session_state.selected_province),
+                ("district", st.session_state.selected_city),
+                ("village", st.session_state.selected_district),
+            )
+            if parent
+        ]
+        prune_region_futures(set(wanted))
+        for endpoint, parent_code in wanted:
+            prefetch_region_dropdown(endpoint, parent_code)
+        
         # Level 1: Provinsi
         with st.spinner("Loading provinsi..."):
             provinces_data = fetch_region_dropdown("province")
@@ -719,11 +1069,9 @@ with col1:
                     if selected_city_name == "-- Gunakan Provinsi --":
                         region_name = selected_province_name
                         with st.spinner(f"Loading geometry {region_name}..."):
-                            geojson_data = fetch_region_geometry("province", province_code)
-                            if geojson_data:
-                                aoi, preview_gdf = geojson_to_ee_geometry(geojson_data)
-                                if aoi:
-                                    st.success(f"✔ Berhasil memuat: {region_name}")
+                            aoi, preview_gdf = load_region_ee("province", province_code, simplify_tolerance)
+                            if aoi:
+                                st.success(f"✔ Berhasil memuat: {region_name}")
                     
                     elif selected_city_name != "-- Pilih Kabupaten/Kota --":
                         city_code = cities_data[selected_city_name]
@@ -747,11 +1095,9 @@ with col1:
                             if selected_district_name == "-- Gunakan Kabupaten/Kota --":
                                 region_name = selected_city_name
                                 with st.spinner(f"Loading geometry {region_name}..."):
-                                    geojson_data = fetch_region_geometry("city", city_code)
-                                    if geojson_data:
-                                        aoi, preview_gdf = geojson_to_ee_geometry(geojson_data)
-                                        if aoi:
-                                            st.success(f"✔ Berhasil memuat: {region_name}")
+                                    aoi, preview_gdf = load_region_ee("city", city_code, simplify_tolerance)
+                                    if aoi:
+                                        st.success(f"✔ Berhasil memuat: {region_name}")
                             
                             elif selected_district_name != "-- Pilih Kecamatan --":
                                 district_code = districts_data[selected_district_name]
@@ -775,22 +1121,18 @@ with col1:
                                     if selected_village_name == "-- Gunakan Kecamatan --":
                                         region_name = selected_district_name
                                         with st.spinner(f"Loading geometry {region_name}..."):
-                                            geojson_data = fetch_region_geometry("district", district_code)
-                                            if geojson_data:
-                                                aoi, preview_gdf = geojson_to_ee_geometry(geojson_data)
-                                                if aoi:
-                                                    st.success(f"✔ Berhasil memuat: {region_name}")
+                                            aoi, preview_gdf = load_region_ee("district", district_code, simplify_tolerance)
+                                            if aoi:
+                                                st.success(f"✔ Berhasil memuat: {region_name}")
                                     
                                     elif selected_village_name != "-- Pilih Kelurahan/Desa --":
                                         village_code = villages_data[selected_village_name]
                                         region_name = selected_village_name
                                         
                                         with st.spinner(f"Loading geometry {region_name}..."):
-                                            geojson_data = fetch_region_geometry("village", village_code)
-                                            if geojson_data:
-                                                aoi, preview_gdf = geojson_to_ee_geometry(geojson_data)
-                                                if aoi:
-                                                    st.success(f"✔ Berhasil memuat: {region_name}")
+                                            aoi, preview_gdf = load_region_ee("village", village_code, simplify_tolerance)
+                                            if aoi:
+                                                st.success(f"✔ Berhasil memuat: {region_name}")
     
     # ========== UPLOAD FILE ==========
     elif aoi_mode == "Upload File (GeoJSON/SHP)":
@@ -820,6 +1162,10 @@ with col1:
         center_geom = ee.Geometry.Point([lon, lat])
         aoi = center_geom.buffer(buffer_km * 1000).bounds()
         region_name = f"Point ({lat:.4f}, {lon:.4f})"
+        # Kotak yang sama dihitung lokal (1° lat ≈ 111.32 km)
+        dlat = buffer_km / 111.32
+        dlon = buffer_km / (111.32 * np.cos(np.radians(lat)))
+        aoi_outline = shapely.geometry.box(lon - dlon, lat - dlat, lon + dlon, lat + dlat).__geo_interface__
 
 with col2:
     # Show attribute table
@@ -842,9 +1188,11 @@ with col2:
         with col_info2:
             st.metric("CRS", str(preview_gdf.crs))
         with col_info3:
-            bounds = preview_gdf.total_bounds
-            area_approx = (bounds[2] - bounds[0]) * (bounds[3] - bounds[1]) * 12100
-            st.metric("Area (approx)", f"{area_approx:.1f} km²")
+            try:
+                area_km2 = describe_aoi(aoi)["area_m2"] / 1e6
+                st.metric("Area", f"{area_km2:.1f} km²")
+            except Exception:
+                st.metric("Area", "-")
     
     elif aoi_mode == "Koordinat & Buffer":
         st.subheader(f"📊 Informasi AOI: {region_name}")
@@ -868,26 +1216,41 @@ elif preview_gdf is not None:
 else:
     start_center = [-6.1754, 106.8272]
 
-draw_map = folium.Map(location=start_center, zoom_start=zoom0, control_scale=True)
-
-if preview_gdf is not None:
-    folium.GeoJson(
-        data=preview_gdf.to_json(),
-        name=f"AOI: {region_name}",
-        style_function=lambda x: {
-            "fillColor": "lightblue",
-            "color": "blue",
-            "weight": 2,
-            "fillOpacity": 0.3
-        },
-        tooltip=region_name
-    ).add_to(draw_map)
+def build_aoi_map(with_draw: bool) -> folium.Map:
+    """Peta AOI (preview wilayah + opsional plugin Draw)"""
+    aoi_map = folium.Map(location=start_center, zoom_start=zoom0, control_scale=True)
+    
+    if preview_gdf is not None:
+        folium.GeoJson(
+            data=preview_gdf.__geo_interface__,
+            name=f"AOI: {region_name}",
+            style_function=lambda x: {
+                "fillColor": "lightblue",
+                "color": "blue",
+                "weight": 2,
+                "fillOpacity": 0.3
+            },
+            tooltip=region_name
+        ).add_to(aoi_map)
+    
+    if with_draw:
+        Draw(export=True).add_to(aoi_map)
+    
+    folium.LayerControl().add_to(aoi_map)
+    return aoi_map
 
 if aoi_mode == "Gambar di Peta (Poligon)":
-    Draw(export=True).add_to(draw_map)
-
-folium.LayerControl().add_to(draw_map)
-m_state = st_folium(draw_map, height=400, returned_objects=["all_drawings"], use_container_width=True, key="aoi_selection_map")
+    draw_map = build_aoi_map(with_draw=True)
+    m_state = st_folium(draw_map, height=400, returned_objects=["all_drawings"], use_container_width=True, key="aoi_selection_map")
+else:
+    # Mode non-gambar: HTML peta statis dibangun ulang hanya jika AOI/tampilan berubah
+    preview_bounds = tuple(preview_gdf.total_bounds) if preview_gdf is not None else None
+    drawmap_key = hash((aoi_mode, region_name, tuple(start_center), zoom0, preview_bounds))
+    if st.session_state.get("_drawmap_key") != drawmap_key:
+        st.session_state["_drawmap_html"] = build_aoi_map(with_draw=False).get_root().render()
+        st.session_state["_drawmap_key"] = drawmap_key
+    components.html(st.session_state["_drawmap_html"], height=400)
+    m_state = {}
 
 if aoi_mode == "Gambar di Peta (Poligon)":
     if st.button("Gunakan AOI dari poligon yang digambar", type="primary", key="use_polygon_btn"):
@@ -896,6 +1259,7 @@ if aoi_mode == "Gambar di Peta (Poligon)":
             last = drawings[-1]
             if last["geometry"]["type"].lower() in ("polygon", "multipolygon"):
                 aoi = ee.Geometry(last["geometry"])
+                aoi_outline = last["geometry"]
                 region_name = "Custom Polygon"
                 st.success("✔ AOI poligon terdeteksi.")
             else:
@@ -907,6 +1271,15 @@ if aoi is None:
     st.warning("⚠️ Silakan pilih AOI terlebih dahulu")
     st.stop()
 
+if aoi_outline is None and preview_gdf is not None:
+    aoi_outline = preview_gdf.__geo_interface__
+
+# Deskripsi AOI (center, luas) sekali untuk seluruh bagian di bawah
+try:
+    aoi_meta = describe_aoi(aoi)
+except Exception:
+    aoi_meta = {}
+
 # =========================
 # 9) ANALYSIS
 # =========================
@@ -931,29 +1304,17 @@ if analysis_type in ["Vegetation Indices Analysis", "Combined Analysis"]:
         status.write(f"📡 Dataset: {sentinel_dataset}")
         status.write(f"📅 Date range: {start_date} to {end_date}")
         
-        s2 = (ee.ImageCollection(dataset_config["collection"])
-              .filterBounds(aoi)
-              .filterDate(start_date, end_date)
-              .filter(ee.Filter.lte("CLOUDY_PIXEL_PERCENTAGE", cloud_threshold))
-              .map(lambda img: mask_s2_clouds(img, dataset_config)))
+        s2_bands = s2_required_bands(dataset_config, selected_indices, include_rgb=True)
+        s2 = get_s2_collection(ee_cache_key(aoi), sentinel_dataset, start_date, end_date, cloud_threshold, s2_bands, aoi)
         
-        collection_size = s2.size().getInfo()
+        collection_size = get_info_cached(s2.size())
         status.write(f"📊 Found {collection_size} images")
         
         if collection_size > 0:
             status.write(f"🔄 Creating {composite_method.lower()} composite...")
             
             # Apply composite method
-            if composite_method == "Median":
-                composite = s2.median().clip(aoi)
-            elif composite_method == "Mean":
-                composite = s2.mean().clip(aoi)
-            elif composite_method == "Max":
-                composite = s2.max().clip(aoi)
-            elif composite_method == "Min":
-                composite = s2.min().clip(aoi)
-            else:
-                composite = s2.median().clip(aoi)
+            composite = reduce_s2_composite(s2, composite_method).clip(aoi)
             
             layers[f"Sentinel-2 RGB ({sentinel_dataset})"] = composite
             vis_params[f"Sentinel-2 RGB ({sentinel_dataset})"] = {
@@ -964,8 +1325,9 @@ if analysis_type in ["Vegetation Indices Analysis", "Combined Analysis"]:
             
             # Calculate selected indices
             status.write(f"📐 Calculating {len(selected_indices)} vegetation indices...")
+            indices_image = calculate_indices(composite, selected_indices)
             for idx_name in selected_indices:
-                index_layer = calculate_index(composite, idx_name)
+                index_layer = indices_image.select(idx_name)
                 index_layers[idx_name] = index_layer
                 layers[f"{idx_name} ({composite_method})"] = index_layer
                 vis_params[f"{idx_name} ({composite_method})"] = {
@@ -989,7 +1351,7 @@ if analysis_type in ["Land Cover Analysis", "Combined Analysis"]:
             status.write(f"🌍 Loading Dynamic World ({dw_mode} mode)...")
             
             if dw_mode == "mode":
-                dw_composite = create_dynamic_world_composite(aoi, start_date_lc, end_date_lc, mode='mode')
+                dw_composite = create_dynamic_world_composite(aoi, start_date_lc, end_date_lc, mode='mode', parallel_scale=tile_scale)
                 layers["Dynamic World"] = dw_composite
                 vis_params["Dynamic World"] = {
                     "min": 0,
@@ -1000,11 +1362,11 @@ if analysis_type in ["Land Cover Analysis", "Combined Analysis"]:
                     ]
                 }
             elif dw_mode == "hillshade":
-                dw_hillshade = create_dynamic_world_composite(aoi, start_date_lc, end_date_lc, mode='hillshade')
+                dw_hillshade = create_dynamic_world_composite(aoi, start_date_lc, end_date_lc, mode='hillshade', parallel_scale=tile_scale)
                 layers["Dynamic World Hillshade"] = dw_hillshade
                 vis_params["Dynamic World Hillshade"] = {}
             else:
-                dw_prob = create_dynamic_world_composite(aoi, start_date_lc, end_date_lc, mode='probability')
+                dw_prob = create_dynamic_world_composite(aoi, start_date_lc, end_date_lc, mode='probability', parallel_scale=tile_scale)
                 layers["DW Water Probability"] = dw_prob.select('water')
                 vis_params["DW Water Probability"] = {"min": 0, "max": 1, "palette": ['white', 'blue']}
         
@@ -1037,86 +1399,115 @@ if analysis_type in ["Land Cover Analysis", "Combined Analysis"]:
 st.subheader("🗺️ Hasil Peta")
 
 try:
-    center_geom = ee.Geometry(aoi).bounds(maxError=10).centroid(maxError=10)
-    lon_center, lat_center = center_geom.coordinates().getInfo()
+    lon_center, lat_center = aoi_meta["center"]
     center_pt = [lat_center, lon_center]
 except:
     center_pt = start_center
 
-# Create tabs for different visualizations
-if len(layers) > 0:
-    tab_names = list(layers.keys())
-    tabs = st.tabs(tab_names)
+def build_result_map(layer_name, layer, layer_vis, center_pt):
+    """Build folium map for one result layer (AOI outline, EE tiles, legend)"""
+    result_map = folium.Map(location=center_pt, zoom_start=zoom0, control_scale=True)
     
-    for i, (layer_name, layer) in enumerate(layers.items()):
-        with tabs[i]:
-            col_map, col_info = st.columns([3, 1])
-            
-            with col_map:
-                result_map = folium.Map(location=center_pt, zoom_start=zoom0, control_scale=True)
-                
-                # Add AOI outline
-                try:
-                    folium.GeoJson(
-                        data=ee.FeatureCollection(ee.Feature(aoi)).getInfo(),
-                        name=f"AOI: {region_name}",
-                        style_function=lambda x: {"fillOpacity": 0, "weight": 2, "color": "red"},
-                        tooltip=region_name
-                    ).add_to(result_map)
-                except:
-                    pass
-                
-                # Add layer
-                result_map.add_ee_layer(layer, vis_params[layer_name], layer_name)
-                
-                # Add legend for land cover layers
-                if "Dynamic World" in layer_name and dw_mode == "mode":
-                    add_legend_to_map(result_map, LAND_COVER_LEGENDS["Dynamic_World"], "Dynamic World")
-                elif layer_name == "ESA WorldCover":
-                    add_legend_to_map(result_map, LAND_COVER_LEGENDS["ESA_WorldCover"], "ESA WorldCover")
-                elif layer_name == "ESRI Land Cover":
-                    add_legend_to_map(result_map, LAND_COVER_LEGENDS["ESRI_LandCover"], "ESRI Land Cover")
-                
-                folium.LayerControl().add_to(result_map)
-                st_folium(result_map, height=600, use_container_width=True, key=f"map_{i}")
+    # Add AOI outline
+    try:
+        folium.GeoJson(
+            data=aoi_outline if aoi_outline is not None else get_info_cached(ee.FeatureCollection(ee.Feature(aoi))),
+            name=f"AOI: {region_name}",
+            style_function=lambda x: {"fillOpacity": 0, "weight": 2, "color": "red"},
+            tooltip=region_name
+        ).add_to(result_map)
+    except:
+        pass
+    
+    # Add layer
+    result_map.add_ee_layer(layer, layer_vis, layer_name)
+    
+    # Add legend for land cover layers
+    if "Dynamic World" in layer_name and dw_mode == "mode":
+        add_legend_to_map(result_map, "Dynamic_World")
+    elif layer_name == "ESA WorldCover":
+        add_legend_to_map(result_map, "ESA_WorldCover")
+    elif layer_name == "ESRI Land Cover":
+        add_legend_to_map(result_map, "ESRI_LandCover")
+    
+    folium.LayerControl().add_to(result_map)
+    return result_map
+
+@st.fragment
+def render_result_maps(layers, vis_params, center_pt):
+    """Render peta layer hasil yang dipilih; interaksi peta hanya me-rerun fragment ini, bukan seluruh script."""
+    # Cache peta per layer: {layer_name: (map_key, folium.Map)}, buang layer yang sudah tidak ada
+    result_maps = {
+        name: cached for name, cached in st.session_state.get("result_maps", {}).items()
+        if name in layers
+    }
+    st.session_state.result_maps = result_maps
+    
+    if len(layers) > 0:
+        tab_names = list(layers.keys())
+        # Hanya layer terpilih yang dirender (satu peta), bukan satu peta per tab
+        layer_name = st.radio("Layer", tab_names, horizontal=True, key="result_layer")
+        layer = layers[layer_name]
+        
+        col_map, col_info = st.columns([3, 1])
+    
+        with col_map:
+            # Pakai ulang peta dari rerun sebelumnya bila layer/vis/AOI tidak berubah
+            map_key = (
+                ee_cache_key(layer),
+                json.dumps(vis_params[layer_name], sort_keys=True),
+                tuple(center_pt),
+                zoom0,
+                region_name,
+            )
+            cached_map = result_maps.get(layer_name)
+            if cached_map is None or cached_map[0] != map_key:
+                result_map = build_result_map(layer_name, layer, vis_params[layer_name], center_pt)
+                result_maps[layer_name] = (map_key, result_map)
+            else:
+                result_map = cached_map[1]
+            st_folium(result_map, height=600, use_container_width=True, key="result_map")
+    
+        with col_info:
+            # Extract base index name
+            base_layer_name = layer_name.split(" (")[0]
+        
+            if base_layer_name in VEGETATION_INDICES:
+                st.markdown("### Info Indeks")
+                info = VEGETATION_INDICES[base_layer_name]
+                st.markdown(f"**{info['name']}**")
+                st.markdown(f"*Formula:* `{info['formula']}`")
+                st.markdown(f"*Deskripsi:* {info['description']}")
+                st.markdown(f"*Range:* {info['range'][0]} to {info['range'][1]}")
             
-            with col_info:
-                # Extract base index name
-                base_layer_name = layer_name.split(" (")[0]
-                
-                if base_layer_name in VEGETATION_INDICES:
-                    st.markdown("### Info Indeks")
-                    info = VEGETATION_INDICES[base_layer_name]
-                    st.markdown(f"**{info['name']}**")
-                    st.markdown(f"*Formula:* `{info['formula']}`")
-                    st.markdown(f"*Deskripsi:* {info['description']}")
-                    st.markdown(f"*Range:* {info['range'][0]} to {info['range'][1]}")
-                    
-                    if analysis_type in ["Vegetation Indices Analysis", "Combined Analysis"]:
-                        st.markdown("---")
-                        st.markdown("### Dataset Info")
-                        st.markdown(f"**Dataset:** {sentinel_dataset}")
-                        st.markdown(f"**Composite:** {composite_method}")
-                
-                elif "Sentinel-2 RGB" in layer_name:
+                if analysis_type in ["Vegetation Indices Analysis", "Combined Analysis"]:
+                    st.markdown("---")
                     st.markdown("### Dataset Info")
                     st.markdown(f"**Dataset:** {sentinel_dataset}")
-                    st.markdown(f"**Collection:** `{dataset_config['collection']}`")
-                    st.markdown(f"**Resolution:** {dataset_config['scale']}m")
                     st.markdown(f"**Composite:** {composite_method}")
-                    st.markdown(f"**Images Used:** {collection_size}")
-                
-                # Show region info
-                st.markdown("---")
-                st.markdown("### Info Wilayah")
-                st.markdown(f"**Nama:** {region_name}")
-                if aoi_mode == "Batas Wilayah Indonesia":
-                    if st.session_state.selected_province:
-                        st.markdown(f"**Provinsi:** {st.session_state.selected_province['name']}")
-                    if st.session_state.selected_city:
-                        st.markdown(f"**Kab/Kota:** {st.session_state.selected_city['name']}")
-                    if st.session_state.selected_district:
-                        st.markdown(f"**Kecamatan:** {st.session_state.selected_district['name']}")
+        
+            elif "Sentinel-2 RGB" in layer_name:
+                st.markdown("### Dataset Info")
+                st.markdown(f"**Dataset:** {sentinel_dataset}")
+                st.markdown(f"**Collection:** `{dataset_config['collection']}`")
+                st.markdown(f"**Resolution:** {dataset_config['scale']}m")
+                st.markdown(f"**Composite:** {composite_method}")
+                st.markdown(f"**Images Used:** {collection_size}")
+        
+            # Show region info
+            st.markdown("---")
+            st.markdown("### Info Wilayah")
+            st.markdown(f"**Nama:** {region_name}")
+            if aoi_mode == "Batas Wilayah Indonesia":
+                if st.session_state.selected_province:
+                    st.markdown(f"**Provinsi:** {st.session_state.selected_province['name']}")
+                if st.session_state.selected_city:
+                    st.markdown(f"**Kab/Kota:** {st.session_state.selected_city['name']}")
+                if st.session_state.selected_district:
+                    st.markdown(f"**Kecamatan:** {st.session_state.selected_district['name']}")
+
+# Render the selected result layer
+render_result_maps(layers, vis_params, center_pt)
 
 # =========================
 # 11) STATISTICS
@@ -1129,133 +1520,143 @@ if index_layers:
         st.write("### Statistik Indeks Vegetasi")
         st.caption(f"Dataset: **{sentinel_dataset}** | Composite: **{composite_method}**")
         
-        # Calculate statistics for all indices
+        # Calculate statistics for all indices in one multi-band reduction (1 RPC)
         stats_data = []
         
-        for idx_name, idx_layer in index_layers.items():
-            try:
-                status.write(f"Calculating {idx_name}...")
-                stats = idx_layer.reduceRegion(
-                    reducer=ee.Reducer.minMax().combine(
-                        ee.Reducer.mean().combine(
-                            ee.Reducer.stdDev(), sharedInputs=True
-                        ), sharedInputs=True
-                    ),
-                    geometry=aoi,
-                    scale=dataset_config["scale"],
-                    maxPixels=1e8,
-                    bestEffort=True,
-                ).getInfo() or {}
-                
+        try:
+            status.write(f"Calculating {len(index_layers)} indices...")
+            multi_band = ee.Image.cat(list(index_layers.values()))
+            all_stats = get_info_cached(multi_band.reduceRegion(
+                reducer=ee.Reducer.minMax().combine(
+                    ee.Reducer.mean().combine(
+                        ee.Reducer.stdDev(), sharedInputs=True
+                    ), sharedInputs=True
+                ),
+                geometry=aoi,
+                scale=dataset_config["scale"],
+                maxPixels=1e8,
+                bestEffort=True,
+                tileScale=tile_scale,
+            )) or {}
+        except Exception as e:
+            st.warning(f"Gagal menghitung statistik indeks: {e}")
+            all_stats = None
+        
+        if all_stats is not None:
+            for idx_name in index_layers:
                 stats_data.append({
                     "Index": idx_name,
-                    "Min": round(stats.get(f"{idx_name}_min", float('nan')), 4),
-                    "Mean": round(stats.get(f"{idx_name}_mean", float('nan')), 4),
-                    "Max": round(stats.get(f"{idx_name}_max", float('nan')), 4),
-                    "Std Dev": round(stats.get(f"{idx_name}_stdDev", float('nan')), 4),
+                    "Min": all_stats.get(f"{idx_name}_min"),
+                    "Mean": all_stats.get(f"{idx_name}_mean"),
+                    "Max": all_stats.get(f"{idx_name}_max"),
+                    "Std Dev": all_stats.get(f"{idx_name}_stdDev"),
                     "Description": VEGETATION_INDICES[idx_name]["description"]
                 })
-                
-            except Exception as e:
-                st.warning(f"Gagal menghitung statistik {idx_name}: {e}")
         
         status.update(label="✅ Statistics calculated", state="complete")
     
     if stats_data:
         # Display as dataframe
         df_stats = pd.DataFrame(stats_data)
+        num_cols = ["Min", "Mean", "Max", "Std Dev"]
+        df_stats[num_cols] = df_stats[num_cols].astype(float).round(4)
+        # JSON/report download memakai nilai yang sudah dibulatkan
+        stats_data = df_stats.to_dict("records")
         st.dataframe(df_stats, use_container_width=True, hide_index=True)
         
-        # Visualizations
-        col1, col2 = st.columns(2)
+        # Grafik dibangun hanya jika diminta (hemat JSON Plotly ke frontend)
+        if st.toggle("Tampilkan grafik statistik", key="show_stats_charts"):
+            # Visualizations
+            col1, col2 = st.columns(2)
         
-        with col1:
-            # Bar chart of mean values
-            fig_bar = px.bar(
-                df_stats, 
-                x='Index', 
-                y='Mean',
-                title=f'Nilai Mean Indeks Vegetasi ({composite_method} Composite)',
-                color='Mean',
-                color_continuous_scale='RdYlGn',
-                text='Mean'
-            )
-            fig_bar.update_traces(texttemplate='%{text:.3f}', textposition='outside')
-            fig_bar.update_layout(height=400)
-            st.plotly_chart(fig_bar, use_container_width=True, key="stats_bar_chart")
+            with col1:
+                # Bar chart of mean values
+                fig_bar = px.bar(
+                    df_stats, 
+                    x='Index', 
+                    y='Mean',
+                    title=f'Nilai Mean Indeks Vegetasi ({composite_method} Composite)',
+                    color='Mean',
+                    color_continuous_scale='RdYlGn',
+                    text='Mean'
+                )
+                fig_bar.update_traces(texttemplate='%{text:.3f}', textposition='outside')
+                fig_bar.update_layout(height=400)
+                st.plotly_chart(fig_bar, use_container_width=True, key="stats_bar_chart")
         
-        with col2:
-            # Range chart
-            fig_range = go.Figure()
+            with col2:
+                # Range chart
+                # Satu trace untuk semua indeks, dipisah dengan None
+                xs, ys = [], []
+                for _, row in df_stats.iterrows():
+                    xs += [row['Min'], row['Mean'], row['Max'], None]
+                    ys += [row['Index']] * 3 + [None]
             
-            for idx in df_stats['Index']:
-                row = df_stats[df_stats['Index'] == idx].iloc[0]
-                fig_range.add_trace(go.Scatter(
-                    x=[row['Min'], row['Mean'], row['Max']],
-                    y=[idx, idx, idx],
+                fig_range = go.Figure(go.Scatter(
+                    x=xs,
+                    y=ys,
                     mode='lines+markers',
-                    name=idx,
+                    connectgaps=False,
                     line=dict(width=3),
                     marker=dict(size=10)
                 ))
             
-            fig_range.update_layout(
-                title='Range Nilai Indeks (Min-Mean-Max)',
-                xaxis_title='Nilai',
-                yaxis_title='Index',
-                height=400,
-                showlegend=False
-            )
-            st.plotly_chart(fig_range, use_container_width=True, key="stats_range_chart")
+                fig_range.update_layout(
+                    title='Range Nilai Indeks (Min-Mean-Max)',
+                    xaxis_title='Nilai',
+                    yaxis_title='Index',
+                    height=400,
+                    showlegend=False
+                )
+                st.plotly_chart(fig_range, use_container_width=True, key="stats_range_chart")
         
         # Correlation matrix if multiple indices
         if len(index_layers) > 1:
             st.write("### Matriks Korelasi Indeks")
             
-            # Sample points for correlation
-            try:
-                with st.spinner("Calculating correlations..."):
-                    # Create a multi-band image
-                    multi_band = ee.Image.cat(list(index_layers.values()))
-                    
-                    # Sample random points
-                    sample = multi_band.sample(
-                        region=aoi,
-                        scale=dataset_config["scale"] * 2,
-                        numPixels=1000,
-                        geometries=False
-                    )
+            # Korelasi (termasuk RPC-nya) hanya dihitung jika diminta
+            if st.toggle("Hitung & tampilkan korelasi", key="show_corr_chart"):
+                # Covariance computed server-side; only the N×N matrix is downloaded
+                try:
+                    with st.spinner("Calculating correlations..."):
+                        # Create a multi-band image
+                        multi_band = ee.Image.cat(list(index_layers.values()))
                     
-                    # Convert to dataframe
-                    sample_dict = sample.getInfo()
-                    features = sample_dict['features']
+                        cov_result = get_info_cached(multi_band.toArray().reduceRegion(
+                            reducer=ee.Reducer.covariance(),
+                            geometry=aoi,
+                            scale=dataset_config["scale"] * 2,
+                            maxPixels=1e8,
+                            bestEffort=True,
+                            tileScale=tile_scale
+                        )) or {}
+                        cov = cov_result.get('array')
                     
-                    if features:
-                        data = []
-                        for feature in features:
-                            data.append(feature['properties'])
-                        
-                        df_corr = pd.DataFrame(data)
+                        if cov:
+                            # Normalisasi kovarians dengan simpangan baku -> korelasi
+                            cov = np.array(cov, dtype=float)
+                            std = np.sqrt(np.diag(cov))
+                            with np.errstate(divide='ignore', invalid='ignore'):
+                                corr = cov / np.outer(std, std)
+                            names = list(index_layers.keys())
+                            correlation = pd.DataFrame(corr, index=names, columns=names)
                         
-                        # Calculate correlation
-                        correlation = df_corr.corr()
-                        
-                        # Create heatmap
-                        fig_corr = px.imshow(
-                            correlation,
-                            labels=dict(x="Index", y="Index", color="Correlation"),
-                            x=correlation.columns,
-                            y=correlation.columns,
-                            color_continuous_scale='RdBu',
-                            aspect="auto",
-                            title=f"Korelasi Antar Indeks Vegetasi ({sentinel_dataset})",
-                            zmin=-1, zmax=1
-                        )
-                        fig_corr.update_layout(height=500)
-                        st.plotly_chart(fig_corr, use_container_width=True, key="corr_heatmap")
+                            # Create heatmap
+                            fig_corr = px.imshow(
+                                correlation,
+                                labels=dict(x="Index", y="Index", color="Correlation"),
+                                x=correlation.columns,
+                                y=correlation.columns,
+                                color_continuous_scale='RdBu',
+                                aspect="auto",
+                                title=f"Korelasi Antar Indeks Vegetasi ({sentinel_dataset})",
+                                zmin=-1, zmax=1
+                            )
+                            fig_corr.update_layout(height=500)
+                            st.plotly_chart(fig_corr, use_container_width=True, key="corr_heatmap")
                         
-            except Exception as e:
-                st.info("Tidak dapat menghitung korelasi: " + str(e))
+                except Exception as e:
+                    st.info("Tidak dapat menghitung korelasi: " + str(e))
 
 # Land Cover Statistics
 if any(lc in layers for lc in ["Dynamic World", "ESA WorldCover", "ESRI Land Cover"]):
@@ -1280,35 +1681,35 @@ if any(lc in layers for lc in ["Dynamic World", "ESA WorldCover", "ESRI Land Cov
                         legend = LAND_COVER_LEGENDS["ESRI_LandCover"]
                         scale = 10
                     
-                    # Calculate pixel counts
-                    pixel_counts = layers[lc_name].select(band_name).reduceRegion(
+                    # AOI besar (> 1000 km²): resolusi histogram diturunkan agar tidak timeout
+                    if aoi_meta.get("area_m2", 0) >= 1e9:
+                        scale *= 2
+                    
+                    # Calculate pixel counts (tileScale memecah tile agar reduksi paralel di server)
+                    pixel_counts = get_info_cached(layers[lc_name].select(band_name).reduceRegion(
                         reducer=ee.Reducer.frequencyHistogram(),
                         geometry=aoi,
                         scale=scale,
-                        maxPixels=1e8,
+                        tileScale=max(8, tile_scale),
+                        maxPixels=1e9,
                         bestEffort=True
-                    ).getInfo()
+                    ))
                     
                     if pixel_counts and band_name in pixel_counts:
                         st.write(f"**{lc_name}**")
                         
-                        # Convert to DataFrame
-                        counts = pixel_counts[band_name]
-                        data = []
-                        for class_val, count in counts.items():
-                            if str(class_val) in legend:
-                                area_ha = count * (scale * scale) / 10000
-                                data.append({
-                                    "Class": legend[str(class_val)]["label"],
-                                    "Color": legend[str(class_val)]["color"],
-                                    "Area (ha)": round(area_ha, 2),
-                                    "Pixels": count
-                                })
+                        # Convert to DataFrame: join histogram with legend (kelas di luar legenda dibuang)
+                        counts = pd.Series(pixel_counts[band_name], dtype="float64", name="Pixels")
+                        counts.index = counts.index.astype(str)
+                        legend_df = pd.DataFrame.from_dict(legend, orient="index").rename(
+                            columns={"label": "Class", "color": "Color"}
+                        )
+                        df = legend_df.join(counts, how="inner")
+                        df["Area (ha)"] = (df["Pixels"] * (scale * scale) / 10000).round(2)
                         
-                        if data:
-                            df = pd.DataFrame(data)
+                        if not df.empty:
                             total_area = df["Area (ha)"].sum()
-                            df["Percentage"] = round(df["Area (ha)"] / total_area * 100, 1)
+                            df["Percentage"] = (df["Area (ha)"] / total_area * 100).round(1)
                             df = df.sort_values("Area (ha)", ascending=False)
                             
                             # Display table
@@ -1325,18 +1726,20 @@ if any(lc in layers for lc in ["Dynamic World", "ESA WorldCover", "ESRI Land Cov
                                 st.metric("Total Area", f"{total_area:.2f} ha")
                             
                             with col2:
-                                # Pie chart
-                                fig_pie = px.pie(
-                                    df, 
-                                    values='Area (ha)', 
-                                    names='Class',
-                                    title=f'Distribusi {lc_name}',
-                                    color='Class',
-                                    color_discrete_map={row['Class']: row['Color'] for _, row in df.iterrows()}
-                                )
-                                fig_pie.update_traces(textposition='inside', textinfo='percent+label')
-                                fig_pie.update_layout(height=400)
-                                st.plotly_chart(fig_pie, use_container_width=True, key=f"lc_pie_{lc_name.replace(' ', '_')}")
+                                if st.toggle("Tampilkan pie chart", key=f"show_lc_pie_{lc_name.replace(' ', '_')}"):
+                                    # Pie chart
+                                    color_map = dict(zip(df['Class'], df['Color']))
+                                    fig_pie = px.pie(
+                                        df, 
+                                        values='Area (ha)', 
+                                        names='Class',
+                                        title=f'Distribusi {lc_name}',
+                                        color='Class',
+                                        color_discrete_map=color_map
+                                    )
+                                    fig_pie.update_traces(textposition='inside', textinfo='percent+label')
+                                    fig_pie.update_layout(height=400)
+                                    st.plotly_chart(fig_pie, use_container_width=True, key=f"lc_pie_{lc_name.replace(' ', '_')}")
                     
                 except Exception as e:
                     st.warning(f"Gagal menghitung statistik {lc_name}: {e}")
@@ -1373,14 +1776,13 @@ if analysis_type in ["Vegetation Indices Analysis", "Combined Analysis"] and sel
                         ds_config = SENTINEL2_DATASETS[ds_name]
                         
                         # Load and process
-                        s2_compare = (ee.ImageCollection(ds_config["collection"])
-                                     .filterBounds(aoi)
-                                     .filterDate(start_date_cmp, end_date_cmp)
-                                     .filter(ee.Filter.lte("CLOUDY_PIXEL_PERCENTAGE", cloud_threshold))
-                                     .map(lambda img: mask_s2_clouds(img, ds_config)))
+                        s2_compare = get_s2_collection(
+                            ee_cache_key(aoi), ds_name, start_date_cmp, end_date_cmp, cloud_threshold,
+                            s2_required_bands(ds_config, [compare_index]), aoi
+                        )
                         
-                        if s2_compare.size().getInfo() > 0:
-                            composite_compare = s2_compare.median().clip(aoi)
+                        if get_info_cached(s2_compare.size()) > 0:
+                            composite_compare = reduce_s2_composite(s2_compare).clip(aoi)
                             index_compare = calculate_index(composite_compare, compare_index)
                             
                             # Calculate stats
@@ -1391,7 +1793,8 @@ if analysis_type in ["Vegetation Indices Analysis", "Combined Analysis"] and sel
                                 geometry=aoi,
                                 scale=ds_config["scale"],
                                 maxPixels=1e8,
-                                bestEffort=True
+                                bestEffort=True,
+                                tileScale=tile_scale
                             ).getInfo()
                             
                             comparison_data.append({
@@ -1440,6 +1843,77 @@ if analysis_type in ["Vegetation Indices Analysis", "Combined Analysis"] and sel
 # =========================
 # 12) TIME SERIES ANALYSIS (if applicable)
 # =========================
+TS_DATASET = "Sentinel-2 SR Harmonized"
+TS_CHUNK_SIZE = 3  # periode per request getInfo paralel
+
+def timeseries_periods(ts_year, ts_interval):
+    """(start, end, label) tiap periode time series"""
+    # filterDate eksklusif di ujung akhir: periode terakhir berakhir 1 Januari tahun berikutnya
+    year_end = pd.Timestamp(f"{ts_year + 1}-01-01")
+    if ts_interval == "Monthly":
+        starts = pd.date_range(f"{ts_year}-01-01", periods=12, freq="MS")
+        ends = starts + pd.offsets.MonthBegin(1)
+        labels = starts.strftime("%m")
+    elif ts_interval == "Bi-weekly":
+        starts = pd.date_range(f"{ts_year}-01-01", f"{ts_year}-12-31", freq="14D")
+        # Sisa < 14 hari di akhir tahun digabung ke periode sebelumnya (tanpa periode 1-2 hari)
+        starts = starts[starts + pd.Timedelta("14D") <= year_end]
+        ends = starts[1:].append(pd.DatetimeIndex([year_end]))
+        labels = starts.strftime("%m%d")
+    else:
+        raise ValueError(f"Interval {ts_interval} belum didukung")
+    return list(zip(starts.strftime("%Y-%m-%d"), ends.strftime("%Y-%m-%d"), labels))
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def compute_timeseries(aoi_key, ts_year, ts_index, ts_interval, use_median, tile_scale, _aoi) -> pd.DataFrame:
+    """Nilai rata-rata indeks per periode, di-cache per (AOI, tahun, indeks, interval, composite)"""
+    # Koleksi setahun difilter sekali; tiap periode jadi satu Feature,
+    # seluruh periode diambil dengan satu getInfo
+    # AOI hasil komputasi (mis. buffer().bounds()) dimaterialisasi sekali jadi GeoJSON literal;
+    # AOI wilayah/upload/gambar sudah literal dan dipakai apa adanya
+    aoi_geom = ee.Geometry(get_info_cached(_aoi)) if _aoi.func is not None else _aoi
+    
+    ts_method = "Median" if use_median else "Quality"
+    ts_bands = s2_required_bands(SENTINEL2_DATASETS[TS_DATASET], [ts_index])
+    if ts_method == "Quality":
+        ts_bands += ("SCL",)
+    s2_ts = get_s2_collection(
+        aoi_key, TS_DATASET, f"{ts_year}-01-01", f"{ts_year + 1}-01-01", 40,
+        ts_bands, aoi_geom, max_cloud_fraction=0.6
+    )
+    
+    period_features = []
+    for start, end, label in timeseries_periods(ts_year, ts_interval):
+        mid_date = pd.Timestamp(start) + (pd.Timestamp(end) - pd.Timestamp(start)) / 2
+        s2_period = s2_ts.filterDate(start, end)
+        index = calculate_index(reduce_s2_composite(s2_period, ts_method), ts_index)
+        mean_value = index.reduceRegion(
+            reducer=ee.Reducer.mean(),
+            geometry=aoi_geom,
+            scale=20,
+            maxPixels=1e8,
+            bestEffort=True,
+            tileScale=tile_scale
+        ).get(ts_index)
+        period_features.append(ee.Feature(None, {
+            "period": label,
+            "date": mid_date.strftime("%Y-%m-%d"),
+            "value": ee.Algorithms.If(s2_period.size().gt(0), mean_value, None)
+        }))
+    
+    # Periode dibagi per chunk dan di-getInfo paralel (urutan hasil tetap)
+    chunks = [period_features[i:i + TS_CHUNK_SIZE] for i in range(0, len(period_features), TS_CHUNK_SIZE)]
+    with ThreadPoolExecutor(max_workers=len(chunks)) as pool:
+        chunk_results = list(pool.map(lambda fs: ee.FeatureCollection(fs).getInfo()["features"], chunks))
+    
+    # Properti seluruh feature langsung jadi DataFrame (periode kosong -> NaN)
+    df_ts = (pd.DataFrame([f["properties"] for features in chunk_results for f in features])
+             .reindex(columns=["period", "date", "value"])
+             .rename(columns={"period": "Period", "date": "Date", "value": "Value"}))
+    df_ts["Value"] = pd.to_numeric(df_ts["Value"])
+    df_ts["Date"] = pd.to_datetime(df_ts["Date"])
+    return df_ts
+
 if analysis_type in ["Vegetation Indices Analysis", "Combined Analysis"] and selected_indices:
     with st.expander("📈 Analisis Time Series (Optional)", expanded=False):
         st.write("Analisis perubahan indeks vegetasi sepanjang tahun")
@@ -1452,105 +1926,82 @@ if analysis_type in ["Vegetation Indices Analysis", "Combined Analysis"] and sel
             ts_year = st.selectbox("Tahun", list(range(2017, 2026)))
         with col3:
             ts_interval = st.selectbox("Interval", ["Monthly", "Bi-weekly"])
+        ts_use_median = st.checkbox(
+            "Gunakan median composite (lebih lambat)", value=False,
+            help="Default: quality mosaic berbasis SCL, jauh lebih cepat untuk rata-rata AOI"
+        )
         
         if st.button("Generate Time Series", type="primary"):
-            with st.spinner("Memproses time series..."):
+            df_ts = None
+            ts_error = None
+            # Satu container status, diperbarui sekali di akhir (bukan per periode)
+            with st.status("Memproses time series...", expanded=False) as ts_status:
                 try:
-                    # Create date ranges
-                    if ts_interval == "Monthly":
-                        date_ranges = []
-                        for month in range(1, 13):
-                            start = f"{ts_year}-{month:02d}-01"
-                            if month == 12:
-                                end = f"{ts_year}-12-31"
-                            else:
-                                end = f"{ts_year}-{month+1:02d}-01"
-                            date_ranges.append((start, end, f"{month:02d}"))
-                    
-                    # Calculate index for each period
-                    time_series_data = []
-                    
-                    progress_bar = st.progress(0)
-                    for idx, (start, end, label) in enumerate(date_ranges):
-                        s2_period = (ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED")
-                                    .filterBounds(aoi)
-                                    .filterDate(start, end)
-                                    .filter(ee.Filter.lte("CLOUDY_PIXEL_PERCENTAGE", 40))
-                                    .map(mask_s2_clouds))
-                        
-                        if s2_period.size().getInfo() > 0:
-                            median = s2_period.median()
-                            index = calculate_index(median, ts_index)
-                            
-                            stats = index.reduceRegion(
-                                reducer=ee.Reducer.mean(),
-                                geometry=aoi,
-                                scale=20,
-                                maxPixels=1e8,
-                                bestEffort=True
-                            ).getInfo()
-                            
-                            time_series_data.append({
-                                "Period": label,
-                                "Value": stats.get(ts_index, None),
-                                "Date": f"{ts_year}-{label}-15"
-                            })
-                        
-                        progress_bar.progress((idx + 1) / len(date_ranges))
-                    
-                    # Create time series plot
-                    if time_series_data:
-                        df_ts = pd.DataFrame(time_series_data)
-                        df_ts = df_ts.dropna(subset=['Value'])
-                        df_ts['Date'] = pd.to_datetime(df_ts['Date'])
-                        
-                        fig_ts = px.line(
-                            df_ts, 
-                            x='Date', 
-                            y='Value',
-                            title=f'Time Series {ts_index} - {ts_year} ({region_name})',
-                            markers=True
-                        )
-                        fig_ts.update_layout(
-                            xaxis_title="Bulan",
-                            yaxis_title=f"{ts_index} Value",
-                            height=400
-                        )
-                        st.plotly_chart(fig_ts, use_container_width=True)
-                        
-                        # Summary statistics
-                        col1, col2, col3, col4 = st.columns(4)
-                        with col1:
-                            st.metric("Min", f"{df_ts['Value'].min():.3f}")
-                        with col2:
-                            st.metric("Max", f"{df_ts['Value'].max():.3f}")
-                        with col3:
-                            st.metric("Mean", f"{df_ts['Value'].mean():.3f}")
-                        with col4:
-                            st.metric("Std Dev", f"{df_ts['Value'].std():.3f}")
-                        
+                    df_all = compute_timeseries(
+                        ee_cache_key(aoi), ts_year, ts_index, ts_interval, ts_use_median, tile_scale, aoi
+                    )
+                    df_ts = df_all.dropna(subset=['Value'])
+                    ts_status.update(
+                        label=f"✅ Time series selesai: {len(df_ts)}/{len(df_all)} periode berisi data",
+                        state="complete"
+                    )
                 except Exception as e:
-                    st.error(f"Error: {e}")
+                    ts_error = e
+                    ts_status.update(label="❌ Gagal memproses time series", state="error")
+            
+            if ts_error is not None:
+                st.error(f"Error: {ts_error}")
+            
+            # Create time series plot
+            if df_ts is not None and not df_ts.empty:
+                fig_ts = px.line(
+                    df_ts, 
+                    x='Date', 
+                    y='Value',
+                    title=f'Time Series {ts_index} - {ts_year} ({region_name})',
+                    markers=True
+                )
+                fig_ts.update_layout(
+                    xaxis_title="Tanggal",
+                    yaxis_title=f"{ts_index} Value",
+                    height=400
+                )
+                st.plotly_chart(fig_ts, use_container_width=True)
+                
+                # Summary statistics
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric("Min", f"{df_ts['Value'].min():.3f}")
+                with col2:
+                    st.metric("Max", f"{df_ts['Value'].max():.3f}")
+                with col3:
+                    st.metric("Mean", f"{df_ts['Value'].mean():.3f}")
+                with col4:
+                    st.metric("Std Dev", f"{df_ts['Value'].std():.3f}")
 
 # =========================
 # 13) DOWNLOAD OPTIONS
 # =========================
-st.subheader("💾 Download Hasil")
-
-col1, col2, col3 = st.columns(3)
-
-with col1:
+@st.cache_data(show_spinner=False)
+def exportable_layer_names(layer_names: Tuple[str, ...]) -> List[str]:
+    """Nama layer yang bisa diexport (hanya nama yang di-cache; ee.Image tetap diambil dari layers terkini)"""
+    return [name for name in layer_names if not name.startswith("DW") or name == "Dynamic World"]
+
+@st.fragment
+def render_export_panel(layers, aoi, region_name, year):
+    """Panel export Drive; interaksi di dalamnya hanya me-rerun fragment ini, bukan seluruh analisis"""
     with st.expander("📥 Export ke Google Drive"):
-        export_options = {name: layer for name, layer in layers.items() 
-                         if not name.startswith("DW") or name == "Dynamic World"}
-        
-        selected_export = st.selectbox("Pilih layer", list(export_options.keys()))
+        selected_export = st.selectbox("Pilih layer", exportable_layer_names(tuple(layers)))
         export_desc = st.text_input("Deskripsi file", value=f"{selected_export}_{region_name}_{year}")
+        export_cog = st.checkbox(
+            "Cloud-Optimized GeoTIFF", value=True,
+            help="COG menyimpan overview & indeks tile sehingga QGIS/rasterio cukup membaca blok yang dibutuhkan"
+        )
         
         if st.button("Start Export", type="primary"):
             try:
                 with st.spinner("Starting export..."):
-                    export_image = export_options[selected_export]
+                    export_image = layers[selected_export]
                     scale = 10 if "Land Cover" in selected_export else 20
                     
                     task = ee.batch.Export.image.toDrive(
@@ -1559,64 +2010,107 @@ with col1:
                         scale=scale,
                         region=aoi,
                         fileFormat='GeoTIFF',
-                        maxPixels=1e9
+                        maxPixels=1e9,
+                        # Ukuran file default EE (satu file untuk AOI umumnya); file kosong tidak ditulis bila dipecah
+                        skipEmptyTiles=True,
+                        formatOptions={'cloudOptimized': export_cog}
                     )
-                    task.start()
-                    st.success(f"✅ Export dimulai!\n\n**Task ID:** `{task.id}`")
+                    # requestId per menit: klik ganda untuk export yang sama tidak membuat task duplikat,
+                    # tetapi export identik tetap bisa dikirim ulang (mis. setelah task gagal) di menit berikutnya
+                    request_id = hashlib.sha1("|".join([
+                        export_desc, selected_export, region_name, str(year),
+                        str(export_cog), ee_cache_key(export_image),
+                        datetime.now().strftime("%Y%m%d%H%M")
+                    ]).encode("utf-8")).hexdigest()[:32]
+                    operation = ee.data.exportImage(request_id, task.config)
+                    task_id = operation.get("name", request_id).rsplit("/", 1)[-1]
+                    st.success(f"✅ Export dimulai!\n\n**Task ID:** `{task_id}`")
                     st.info("Cek progress di [Google Earth Engine Tasks](https://code.earthengine.google.com/tasks)")
             except Exception as e:
                 st.error(f"❌ Gagal export: {e}")
 
-with col2:
-    # Download statistics
+@st.cache_data(show_spinner=False)
+def _stats_json_body(region_name, year, analysis_type, stats_data) -> bytes:
+    """JSON statistik tanpa tanggal, di-cache per hasil analisis (tidak di-encode ulang tiap rerun)"""
     all_stats = {
-        "analysis_date": datetime.now().isoformat(),
         "region": region_name,
         "year": year,
         "analysis_type": analysis_type
     }
     
-    if 'stats_data' in locals() and stats_data:
+    if stats_data:
         all_stats["vegetation_indices"] = stats_data
     
-    json_str = json.dumps(all_stats, indent=2)
+    return orjson.dumps(all_stats, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+
+def build_stats_json(region_name, year, analysis_type, stats_data, analysis_date: datetime) -> bytes:
+    """JSON statistik untuk diunduh; analysis_date disisipkan sebagai key pertama di luar cache"""
+    body = _stats_json_body(region_name, year, analysis_type, stats_data)
+    return b'{\n  "analysis_date": ' + orjson.dumps(analysis_date.isoformat()) + b"," + body[1:]
+
+@st.cache_data(show_spinner=False)
+def _report_body(region_name, year, analysis_type, aoi_mode, stats_data) -> str:
+    """Isi laporan Markdown setelah baris tanggal, di-cache per hasil analisis"""
+    parts = [f"""**Wilayah:** {region_name}
+**Tahun Data:** {year}
+**Tipe Analisis:** {analysis_type}
+
+## Area of Interest
+- Mode: {aoi_mode}
+- Nama Wilayah: {region_name}
+"""]
+    
+    if stats_data:
+        parts.append("\n## Statistik Indeks Vegetasi\n")
+        for stat in stats_data:
+            parts.extend([
+                f"\n### {stat['Index']} ({stat['Description']})\n",
+                f"- Min: {stat['Min']}\n",
+                f"- Mean: {stat['Mean']}\n",
+                f"- Max: {stat['Max']}\n",
+                f"- Std Dev: {stat['Std Dev']}\n",
+            ])
+    
+    parts.append("\n---\n*Generated by GEE Land Cover & Vegetation Analysis Platform*")
+    return "".join(parts)
+
+def build_report(region_name, year, analysis_type, aoi_mode, stats_data, analysis_date: datetime) -> str:
+    """Laporan Markdown; tanggal analisis diisi di luar cache"""
+    header = f"""# Laporan Analisis GEE
+        
+**Tanggal Analisis:** {analysis_date.strftime('%Y-%m-%d %H:%M')}
+"""
+    return header + _report_body(region_name, year, analysis_type, aoi_mode, stats_data)
+
+st.subheader("💾 Download Hasil")
+
+col1, col2, col3 = st.columns(3)
+
+with col1:
+    render_export_panel(layers, aoi, region_name, year)
+
+download_stats = stats_data if 'stats_data' in locals() else None
+download_time = datetime.now()
+
+with col2:
+    # Download statistics
+    json_str = build_stats_json(region_name, year, analysis_type, download_stats, download_time)
     st.download_button(
         "📊 Download Statistik (JSON)",
         data=json_str,
-        file_name=f"stats_{region_name.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+        file_name=f"stats_{region_name.replace(' ', '_')}_{download_time.strftime('%Y%m%d_%H%M%S')}.json",
         mime="application/json"
     )
 
 with col3:
     # Generate report
     if st.button("📄 Generate Report", type="secondary"):
-        report = f"""# Laporan Analisis GEE
-        
-**Tanggal Analisis:** {datetime.now().strftime('%Y-%m-%d %H:%M')}
-**Wilayah:** {region_name}
-**Tahun Data:** {year}
-**Tipe Analisis:** {analysis_type}
-
-## Area of Interest
-- Mode: {aoi_mode}
-- Nama Wilayah: {region_name}
-"""
-        
-        if 'stats_data' in locals() and stats_data:
-            report += "\n## Statistik Indeks Vegetasi\n"
-            for stat in stats_data:
-                report += f"\n### {stat['Index']} ({stat['Description']})\n"
-                report += f"- Min: {stat['Min']}\n"
-                report += f"- Mean: {stat['Mean']}\n"
-                report += f"- Max: {stat['Max']}\n"
-                report += f"- Std Dev: {stat['Std Dev']}\n"
-        
-        report += "\n---\n*Generated by GEE Land Cover & Vegetation Analysis Platform*"
+        report = build_report(region_name, year, analysis_type, aoi_mode, download_stats, download_time)
         
         st.download_button(
             "Download Report (Markdown)",
             data=report,
-            file_name=f"report_{region_name.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md",
+            file_name=f"report_{region_name.replace(' ', '_')}_{download_time.strftime('%Y%m%d_%H%M%S')}.md",
             mime="text/markdown"
         )
 